@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db.models import Count
 from .models import (User, Tag, Ingredient, Recipe, RecipeIngredient,
                      Follow, Favorite, ShoppingCart)
 
@@ -39,40 +40,65 @@ class IngredientAdmin(admin.ModelAdmin):
 class RecipeAdmin(admin.ModelAdmin):
     """Admin configuration for the Recipe model."""
     list_display = ('name', 'author', 'get_favorite_count', 'pub_date')
-    list_filter = ('author__username', 'name', 'tags__name') # Filter by author username, recipe name, tag name
-    search_fields = ('name', 'author__username')
+    list_select_related = ('author',) # Join only the FK shown in the list
+    # Filter by author and tag FKs, listing only values used by some recipe
+    # (recipe names are covered by search_fields)
+    list_filter = (('author', admin.RelatedOnlyFieldListFilter),
+                   ('tags', admin.RelatedOnlyFieldListFilter))
+    search_fields = ('name',) # Filter by author via the sidebar instead
     readonly_fields = ('get_favorite_count', 'pub_date')
     inlines = [RecipeIngredientInline] # Add ingredients directly in recipe admin
     filter_horizontal = ('tags',) # Better UI for ManyToMany tags
     autocomplete_fields = ('author',) # Autocomplete for author selection
+    # Meta.ordering is not applied to the GROUP BY query from get_queryset
+    ordering = ('-pub_date',)
 
-    @admin.display(description='Times Favorited')
+    def get_queryset(self, request):
+        """
+        Annotate favorite counts in the changelist query instead of per row;
+        other views (change form, autocomplete) skip the join.
+        """
+        queryset = super().get_queryset(request)
+        match = request.resolver_match
+        if match and match.url_name == 'api_recipe_changelist':
+            # distinct=True keeps the count correct when filters join tags
+            queryset = queryset.annotate(
+                _favorite_count=Count('favorited_by', distinct=True))
+        return queryset
+
+    @admin.display(description='Times Favorited', ordering='_favorite_count')
     def get_favorite_count(self, obj):
-        """Calculate and display the number of times a recipe is favorited."""
-        return obj.favorited_by.count()
+        """Display the number of times a recipe is favorited."""
+        if hasattr(obj, '_favorite_count'):
+            return obj._favorite_count
+        # Single-recipe views are not annotated; the add form has no recipe yet
+        return obj.favorited_by.count() if obj.pk else 0
 
 @admin.register(Follow)
 class FollowAdmin(admin.ModelAdmin):
     """Admin configuration for the Follow model."""
     list_display = ('id', 'user', 'following') # Added id for clarity
-    search_fields = ('user__username', 'following__username')
-    list_filter = ('user__username', 'following__username') # Filter by usernames
+    list_select_related = ('user', 'following')
+    list_filter = (('user', admin.RelatedOnlyFieldListFilter),
+                   ('following', admin.RelatedOnlyFieldListFilter)) # Filter by users
     autocomplete_fields = ('user', 'following') # Easier user selection
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     """Admin configuration for the Favorite model."""
     list_display = ('id', 'user', 'recipe') # Added id for clarity
-    search_fields = ('user__username', 'recipe__name')
-    list_filter = ('user__username', 'recipe__name') # Filter by usernames and recipe names
+    list_select_related = ('user', 'recipe')
+    list_filter = (('user', admin.RelatedOnlyFieldListFilter),
+                   ('recipe', admin.RelatedOnlyFieldListFilter)) # Filter by users and recipes
     autocomplete_fields = ('user', 'recipe')
 
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
     """Admin configuration for the ShoppingCart model."""
     list_display = ('id', 'user', 'recipe') # Added id for clarity
-    search_fields = ('user__username', 'recipe__name')
-    list_filter = ('user__username', 'recipe__name') # Filter by usernames and recipe names
+    list_select_related = ('user', 'recipe')
+    list_filter = (('user', admin.RelatedOnlyFieldListFilter),
+                   ('recipe', admin.RelatedOnlyFieldListFilter)) # Filter by users and recipes
     autocomplete_fields = ('user', 'recipe')
 
 # Note: RecipeIngredient is managed via inline in RecipeAdmin,
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+class ApiConfig(AppConfig):
+    """App config for the API app; connects its signal handlers."""
+    name = 'api'
+
+    def ready(self):
+        from . import signals # noqa: F401 (registers the receivers)
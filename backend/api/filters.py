@@ -1,7 +1,7 @@
 from django_filters.rest_framework import FilterSet, filters
 from rest_framework.filters import SearchFilter
 
-from .models import Recipe, Ingredient, Tag, Favorite, ShoppingCart
+from .models import Recipe, Ingredient, Tag
 
 class IngredientSearchFilter(SearchFilter):
     """Custom search filter parameter name for ingredients."""
@@ -30,23 +30,30 @@ class RecipeFilter(FilterSet):
         # Fields that can be filtered directly by model field lookup
         fields = ('author',) # Allows filtering like ?author=1
 
-    def _filter_user_recipe_list(self, queryset, name, value, related_model):
+    def _filter_user_recipe_list(self, queryset, name, value, flag_name):
         """
         Helper method to filter recipes based on user's related lists
-        (Favorites or ShoppingCart).
+        (Favorites or ShoppingCart), using the flag annotated by
+        `Recipe.objects.with_user_flags()`.
         """
         user = self.request.user
         if value and user.is_authenticated:
-            # Filter recipes that exist in the related model for the current user
-            return queryset.filter(pk__in=related_model.objects.filter(user=user).values_list('recipe_id'))
+            # Annotate the flags if the view has not already done so
+            if flag_name not in queryset.query.annotations:
+                queryset = queryset.with_user_flags(user)
+            # Filtering on the EXISTS annotation reuses it as a semi-join
+            # on the (user, recipe) unique index
+            return queryset.filter(**{flag_name: True})
         # If value is False or user is not authenticated, return the original queryset
         # (We don't filter for "not favorited" or "not in cart" based on requirements)
         return queryset
 
     def filter_is_favorited(self, queryset, name, value):
         """Filter recipes based on whether they are in the user's favorites."""
-        return self._filter_user_recipe_list(queryset, name, value, Favorite)
+        return self._filter_user_recipe_list(
+            queryset, name, value, 'is_favorited_flag')
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         """Filter recipes based on whether they are in the user's shopping cart."""
-        return self._filter_user_recipe_list(queryset, name, value, ShoppingCart)
\ No newline at end of file
+        return self._filter_user_recipe_list(
+            queryset, name, value, 'is_in_cart_flag')
\ No newline at end of file
@@ -1,25 +1,46 @@
-import base64
-
-from django.contrib.auth.models import AbstractUser
-from django.core.files.base import ContentFile
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.core.validators import MinValueValidator, RegexValidator
 from django.utils.translation import gettext_lazy as _
 from django.db import models
 
 # --- Custom Field for Base64 Images ---
 class Base64ImageField(models.ImageField):
-    """Custom ImageField to handle Base64 encoded images."""
-    def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            # base64 encoded image - decode
-            format, imgstr = data.split(';base64,') # format ~= data:image/X,
-            ext = format.split('/')[-1] # guess file extension
-            # Generate a unique name or use a default one
-            name = f'image.{ext}'
-            data = ContentFile(base64.b64decode(imgstr), name=name)
-        return super().to_internal_value(data)
+    """
+    ImageField for images uploaded as base64 data URIs. Model fields never
+    see the raw payload: it is decoded by the API serializers
+    (drf_extra_fields' Base64ImageField) before it reaches the model.
+    """
 
 # --- Custom User Model ---
+class UserQuerySet(models.QuerySet):
+    """QuerySet with helpers for annotating users for the current user."""
+
+    def with_is_subscribed(self, user):
+        """
+        Annotate each user with `is_subscribed` for the given user
+        (one EXISTS subquery instead of a query per serialized user).
+        """
+        if not user.is_authenticated:
+            return self.annotate(is_subscribed=models.Value(
+                False, output_field=models.BooleanField()))
+        return self.annotate(is_subscribed=models.Exists(
+            Follow.objects.filter(user=user, following=models.OuterRef('pk'))))
+
+    def with_recipes_count(self):
+        """Annotate each user with the number of recipes they authored."""
+        return self.annotate(recipes_count=models.Count('recipes'))
+
+    def only_profile(self):
+        """
+        Load only the columns CustomUserSerializer renders, leaving out the
+        password hash, login timestamps and permission flags.
+        """
+        return self.only('id', 'email', 'username', 'first_name',
+                         'last_name', 'avatar')
+
+class CustomUserManager(UserManager.from_queryset(UserQuerySet)):
+    """User manager exposing the UserQuerySet helpers."""
+
 class User(AbstractUser):
     """Custom User Model."""
     USERNAME_FIELD = 'email'
@@ -45,6 +66,8 @@ class User(AbstractUser):
         blank=True
     )
 
+    objects = CustomUserManager()
+
     class Meta:
         verbose_name = 'User'
         verbose_name_plural = 'Users'
@@ -107,6 +130,48 @@ class Ingredient(models.Model):
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
 
+class RecipeQuerySet(models.QuerySet):
+    """QuerySet with helpers for annotating recipes for the current user."""
+
+    def with_related(self, user):
+        """
+        Prefetch tags, ingredient amounts (joined with their Ingredient) and
+        the author annotated with `is_subscribed` for the given user, so
+        serializing a page of recipes takes a constant number of queries.
+        """
+        return self.prefetch_related(
+            'tags',
+            models.Prefetch(
+                'author',
+                queryset=User.objects.only_profile().with_is_subscribed(user)
+            ),
+            models.Prefetch(
+                'recipeingredients',
+                # Only the columns RecipeIngredientReadSerializer reads; the
+                # `recipe` FK is needed to attach the rows to their recipes
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ).only('recipe', 'amount', 'ingredient__name',
+                       'ingredient__measurement_unit')
+            ),
+        )
+
+    def with_user_flags(self, user):
+        """
+        Annotate each recipe with `is_favorited_flag` / `is_in_cart_flag`
+        for the given user (two EXISTS subqueries instead of 2N queries).
+        """
+        if not user.is_authenticated:
+            no_flag = models.Value(False, output_field=models.BooleanField())
+            return self.annotate(is_favorited_flag=no_flag,
+                                 is_in_cart_flag=no_flag)
+        return self.annotate(
+            is_favorited_flag=models.Exists(Favorite.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+            is_in_cart_flag=models.Exists(ShoppingCart.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+        )
+
 class Recipe(models.Model):
     """Recipe details."""
     author = models.ForeignKey(
@@ -146,10 +211,17 @@ class Recipe(models.Model):
         auto_now_add=True,
     )
 
+    objects = RecipeQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Recipe'
         verbose_name_plural = 'Recipes'
-        ordering = ('-pub_date',) # Default sort: newest first
+        ordering = ('-pub_date', '-id') # Default sort: newest first
+        indexes = [
+            # Serves the default ordering and keyset pagination
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -177,7 +249,10 @@ class RecipeIngredient(models.Model):
         verbose_name = 'Recipe Ingredient'
         verbose_name_plural = 'Recipe Ingredients'
         constraints = [
+            # `amount` is stored in the index (PostgreSQL INCLUDE), so the
+            # shopping list aggregation can read it with index-only scans
             models.UniqueConstraint(fields=['recipe', 'ingredient'],
+                                    include=['amount'],
                                     name='unique_recipe_ingredient')
         ]
 
@@ -199,6 +274,7 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following', # The one being followed
         verbose_name='Following',
+        db_index=False, # Covered by the ('following', 'user') index
     )
 
     class Meta:
@@ -210,6 +286,12 @@ class Follow(models.Model):
             models.CheckConstraint(check=~models.Q(user=models.F('following')),
                                    name='prevent_self_follow')
         ]
+        # ('user', 'following') is already indexed by unique_follow;
+        # this one serves lookups of a user's followers
+        indexes = [
+            models.Index(fields=['following', 'user'],
+                         name='follow_following_user_idx')
+        ]
 
     def __str__(self):
         return f'{self.user} follows {self.following}'
@@ -227,6 +309,7 @@ class Favorite(models.Model):
         on_delete=models.CASCADE,
         related_name='favorited_by',
         verbose_name='Recipe',
+        db_index=False, # Covered by the ('recipe', 'user') index
     )
 
     class Meta:
@@ -236,6 +319,12 @@ class Favorite(models.Model):
             models.UniqueConstraint(fields=['user', 'recipe'],
                                     name='unique_favorite')
         ]
+        # ('user', 'recipe') is already indexed by unique_favorite;
+        # this one serves per-recipe lookups (counts, cascades)
+        indexes = [
+            models.Index(fields=['recipe', 'user'],
+                         name='favorite_recipe_user_idx')
+        ]
 
     def __str__(self):
         return f'{self.user} favorites {self.recipe}'
@@ -253,6 +342,7 @@ class ShoppingCart(models.Model):
         on_delete=models.CASCADE,
         related_name='in_shopping_carts',
         verbose_name='Recipe',
+        db_index=False, # Covered by the ('recipe', 'user') index
     )
 
     class Meta:
@@ -262,6 +352,12 @@ class ShoppingCart(models.Model):
             models.UniqueConstraint(fields=['user', 'recipe'],
                                     name='unique_shopping_cart_item')
         ]
+        # ('user', 'recipe') is already indexed by unique_shopping_cart_item;
+        # this one serves per-recipe lookups (joins, cascades)
+        indexes = [
+            models.Index(fields=['recipe', 'user'],
+                         name='cart_recipe_user_idx')
+        ]
 
     def __str__(self):
         return f'{self.recipe} in {self.user}\'s shopping cart'
\ No newline at end of file
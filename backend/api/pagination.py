@@ -1,4 +1,18 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination: each page is an indexed range scan, so its
+    cost does not grow with the page depth like LIMIT/OFFSET does.
+    The ordering is set by CustomPageNumberPagination.cursor_ordering.
+    """
+    page_size_query_param = 'limit'
+
+    def decode_cursor(self, request):
+        # An empty 'cursor' parameter requests the first page
+        if not request.query_params.get(self.cursor_query_param):
+            return None
+        return super().decode_cursor(request)
 
 class CustomPageNumberPagination(PageNumberPagination):
     """
@@ -9,4 +23,32 @@ class CustomPageNumberPagination(PageNumberPagination):
     # PAGE_SIZE is set globally in settings.REST_FRAMEWORK['PAGE_SIZE']
     # You could set a default page_size here as well if needed:
     # page_size = 6
-    # max_page_size = 100 # Optional: Set a maximum page size
\ No newline at end of file
+    # max_page_size = 100 # Optional: Set a maximum page size
+
+    # Ordering for keyset pagination. When set, requests passing a 'cursor'
+    # parameter (empty for the first page) are paginated by KeysetPagination;
+    # page numbers stay the default, as the frontend relies on them and
+    # on 'count'.
+    cursor_ordering = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_paginator = None
+        if (self.cursor_ordering is None
+                or KeysetPagination.cursor_query_param not in request.query_params):
+            return super().paginate_queryset(queryset, request, view)
+        self.keyset_paginator = KeysetPagination()
+        self.keyset_paginator.ordering = self.cursor_ordering
+        return self.keyset_paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset_paginator is not None:
+            return self.keyset_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+class RecipePagination(CustomPageNumberPagination):
+    """Recipe pagination, keyset-capable on the (pub_date, id) index."""
+    cursor_ordering = ('-pub_date', '-id')
+
+class SubscriptionPagination(CustomPageNumberPagination):
+    """Subscriptions pagination, keyset-capable on the user primary key."""
+    cursor_ordering = ('id',)
\ No newline at end of file
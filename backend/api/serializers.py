@@ -1,17 +1,54 @@
+from urllib.parse import urljoin
+
+from django.conf import settings
 from django.db import transaction
+from django.utils.encoding import filepath_to_uri
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 from drf_extra_fields.fields import Base64ImageField # Use the field from the library
 
-from .models import (User, Tag, Ingredient, Recipe, RecipeIngredient,
-                     Follow, Favorite, ShoppingCart)
+from .models import User, Tag, Ingredient, Recipe, RecipeIngredient
+
+
+def build_media_url(request, file):
+    """
+    Build the (absolute, if a request is given) URL of a stored file from
+    its name and MEDIA_URL, without asking the storage backend for it.
+    """
+    if not file:
+        return None
+    url = urljoin(settings.MEDIA_URL, filepath_to_uri(file.name))
+    return request.build_absolute_uri(url) if request else url
+
+
+class MediaURLBase64ImageField(Base64ImageField):
+    """
+    Base64ImageField whose URL is built by `build_media_url`, so rendering
+    many users (e.g. recipe authors) makes no storage backend call per row.
+    """
+    def to_representation(self, value):
+        return build_media_url(self.context.get('request'), value)
+
+
+class PrimaryKeyValueField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField that only parses the key, with the same errors;
+    the parent serializer fetches the instances for all keys in one query.
+    """
+    def to_internal_value(self, data):
+        try:
+            if isinstance(data, bool):
+                raise TypeError
+            return int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
 
 
 # --- User Serializers (Djoser customization) ---
 class CustomUserSerializer(UserSerializer):
     """Serializer for User display, includes subscription status."""
     is_subscribed = serializers.SerializerMethodField(read_only=True)
-    avatar = Base64ImageField(required=False, allow_null=True)
+    avatar = MediaURLBase64ImageField(required=False, allow_null=True)
 
     class Meta:
         model = User
@@ -19,12 +56,28 @@ class CustomUserSerializer(UserSerializer):
                   'is_subscribed', 'avatar')
 
     def get_is_subscribed(self, obj):
-        """Check if the request user is subscribed to the obj user."""
+        """
+        Return the subscription status annotated by
+        `User.objects.with_is_subscribed()`; False when not annotated
+        (e.g. /users/me/, where the user cannot follow themselves).
+        """
+        return getattr(obj, 'is_subscribed', False)
+
+    def to_representation(self, instance):
+        """
+        Memoize the representation per request and user: a page of recipes
+        often repeats the same author, who is then serialized only once.
+        """
         request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False
-        user = request.user
-        return Follow.objects.filter(user=user, following=obj).exists()
+        if request is None:
+            return super().to_representation(instance)
+        cache = getattr(request, '_user_representation_cache', None)
+        if cache is None:
+            cache = request._user_representation_cache = {}
+        key = (type(self), instance.pk)
+        if key not in cache:
+            cache[key] = super().to_representation(instance)
+        return cache[key]
 
 class CustomUserCreateSerializer(UserCreateSerializer):
     """Serializer for User creation."""
@@ -62,7 +115,8 @@ class RecipeIngredientReadSerializer(serializers.ModelSerializer):
 class RecipeIngredientWriteSerializer(serializers.Serializer):
     """Serializer for writing ingredient amounts when creating/updating a recipe."""
     # Use Serializer, not ModelSerializer, as we don't directly map to RecipeIngredient fields
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    # Resolved to Ingredient instances in bulk by RecipeWriteSerializer
+    id = PrimaryKeyValueField(queryset=Ingredient.objects.all())
     amount = serializers.IntegerField(min_value=1, error_messages={'min_value': 'Amount must be at least 1.'})
 
     # No Meta class needed here as it's not a ModelSerializer
@@ -89,26 +143,19 @@ class RecipeReadSerializer(serializers.ModelSerializer):
                   'is_in_shopping_cart', 'name', 'image', 'text',
                   'cooking_time')
 
-    def _get_user_recipe_status(self, obj, related_model):
-        """Helper to check if user has added recipe to Favorite/ShoppingCart."""
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False
-        user = request.user
-        return related_model.objects.filter(user=user, recipe=obj).exists()
-
+    # Both flags are annotated by `Recipe.objects.with_user_flags()`,
+    # so no query is issued per recipe
     def get_is_favorited(self, obj):
-        return self._get_user_recipe_status(obj, Favorite)
+        return getattr(obj, 'is_favorited_flag', False)
 
     def get_is_in_shopping_cart(self, obj):
-        return self._get_user_recipe_status(obj, ShoppingCart)
+        return getattr(obj, 'is_in_cart_flag', False)
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
     """Serializer for creating/updating Recipes."""
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True
-    )
+    # Resolved to Tag instances in bulk by validate_tags
+    tags = PrimaryKeyValueField(queryset=Tag.objects.all(), many=True)
     # Use the custom write serializer for ingredients
     ingredients = RecipeIngredientWriteSerializer(many=True)
     # Use Base64ImageField for writing
@@ -123,16 +170,41 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
                   'cooking_time', 'author') # Author included for potential display after create
         read_only_fields = ('id', 'author')
 
+    def _invalid_pk_message(self, pk):
+        """The error PrimaryKeyRelatedField reports for an unknown key."""
+        return serializers.PrimaryKeyRelatedField.default_error_messages[
+            'does_not_exist'].format(pk_value=pk)
+
+    def _get_objects_in_bulk(self, model, pks):
+        """
+        Fetch the model instances for the given primary keys in one query
+        (instead of one per key), rejecting unknown keys.
+        """
+        objects = model.objects.in_bulk(pks)
+        for pk in pks:
+            if pk not in objects:
+                raise serializers.ValidationError(self._invalid_pk_message(pk))
+        return objects
+
     def validate_ingredients(self, ingredients):
         if not ingredients:
             raise serializers.ValidationError("At least one ingredient is required.")
-        ingredient_ids = []
+        ingredients_map = Ingredient.objects.in_bulk(
+            [item['id'] for item in ingredients])
+        if any(item['id'] not in ingredients_map for item in ingredients):
+            # Report unknown ids per item, as the nested serializer would
+            raise serializers.ValidationError([
+                {} if item['id'] in ingredients_map
+                else {'id': [self._invalid_pk_message(item['id'])]}
+                for item in ingredients
+            ])
+        ingredient_ids = set()
         for item in ingredients:
-            # item['id'] is actually the Ingredient object here due to PrimaryKeyRelatedField
-            ingredient = item['id']
-            if ingredient in ingredient_ids:
-                 raise serializers.ValidationError(f"Ingredient '{ingredient.name}' added more than once.")
-            ingredient_ids.append(ingredient)
+            if item['id'] in ingredient_ids:
+                raise serializers.ValidationError(f"Ingredient '{ingredients_map[item['id']].name}' added more than once.")
+            ingredient_ids.add(item['id'])
+            # Replace the pk with the Ingredient instance for create/update
+            item['id'] = ingredients_map[item['id']]
             # Amount validation happens in RecipeIngredientWriteSerializer
         return ingredients
 
@@ -141,21 +213,60 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("At least one tag is required.")
         if len(tags) != len(set(tags)):
             raise serializers.ValidationError("Tags must be unique.")
-        return tags
+        tags_map = self._get_objects_in_bulk(Tag, tags)
+        return [tags_map[pk] for pk in tags]
 
-    def _add_ingredients_and_tags(self, recipe, ingredients_data, tags_data):
-        """Helper to add ingredients and tags after recipe is created/updated."""
-        # Clear existing ingredients before adding new ones (for update)
-        RecipeIngredient.objects.filter(recipe=recipe).delete()
-        recipe_ingredients = [
+    def _create_ingredients(self, recipe, ingredients_data):
+        """Insert the given ingredient amounts for the recipe in one query."""
+        RecipeIngredient.objects.bulk_create([
             RecipeIngredient(
                 recipe=recipe,
                 ingredient=item['id'], # item['id'] is the Ingredient instance
                 amount=item['amount']
             ) for item in ingredients_data
-        ]
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
-        recipe.tags.set(tags_data)
+        ])
+
+    def _set_ingredients(self, recipe, ingredients_data):
+        """
+        Sync the recipe's ingredient amounts with `ingredients_data`,
+        writing only the rows that were added, changed or removed.
+        """
+        existing = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.recipeingredients.all()
+        }
+        # item['id'] is the Ingredient instance
+        new_items = {item['id'].pk: item for item in ingredients_data}
+
+        self._create_ingredients(recipe, [
+            item for ingredient_id, item in new_items.items()
+            if ingredient_id not in existing
+        ])
+
+        changed = []
+        for ingredient_id, recipe_ingredient in existing.items():
+            item = new_items.get(ingredient_id)
+            if item is not None and recipe_ingredient.amount != item['amount']:
+                recipe_ingredient.amount = item['amount']
+                changed.append(recipe_ingredient)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+
+        removed_ids = existing.keys() - new_items.keys()
+        if removed_ids:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed_ids
+            ).delete()
+
+    def _add_ingredients_and_tags(self, recipe, ingredients_data, tags_data):
+        """
+        Helper to add ingredients and tags after recipe is created/updated.
+        Either may be None (partial update), in which case it is left as is.
+        """
+        if ingredients_data is not None:
+            self._set_ingredients(recipe, ingredients_data)
+        if tags_data is not None:
+            recipe.tags.set(tags_data)
 
     @transaction.atomic # Ensure atomicity
     def create(self, validated_data):
@@ -163,7 +274,9 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         tags_data = validated_data.pop('tags')
         # Author is added from the request context in the view's perform_create
         recipe = Recipe.objects.create(**validated_data)
-        self._add_ingredients_and_tags(recipe, ingredients_data, tags_data)
+        # A new recipe has no ingredient rows to diff against
+        self._create_ingredients(recipe, ingredients_data)
+        recipe.tags.set(tags_data)
         return recipe
 
     @transaction.atomic # Ensure atomicity
@@ -177,26 +290,18 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         instance = super().update(instance, validated_data)
 
         # Update M2M/related fields only if new data was provided
-        if ingredients_data is not None:
-            # Clear existing and add new ones
-            RecipeIngredient.objects.filter(recipe=instance).delete()
-            recipe_ingredients = [
-                RecipeIngredient(
-                    recipe=instance,
-                    ingredient=item['id'],
-                    amount=item['amount']
-                ) for item in ingredients_data
-            ]
-            RecipeIngredient.objects.bulk_create(recipe_ingredients)
-
-        if tags_data is not None:
-            instance.tags.set(tags_data)
+        self._add_ingredients_and_tags(instance, ingredients_data, tags_data)
 
         # No need to call instance.save() again, super().update() handles it.
         return instance
 
     def to_representation(self, instance):
         # Use the read serializer for representation after create/update
+        # Re-read the recipe with relations prefetched and user flags
+        # annotated, instead of letting the read serializer lazy-load them
+        user = self.context['request'].user
+        instance = Recipe.objects.with_related(user).with_user_flags(
+            user).get(pk=instance.pk)
         # Pass the context from the write serializer to the read serializer
         return RecipeReadSerializer(instance, context=self.context).data
 
@@ -233,28 +338,38 @@ class FollowSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, obj):
         """Check if the request user is subscribed to this 'obj' (the 'following' user)."""
-        # This should always be true when listing subscriptions, but good practice
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False # Should not happen in subscriptions view
-        user = request.user
-        # 'obj' here is the user being followed (the 'following' field in the Follow model)
-        return Follow.objects.filter(user=user, following=obj).exists()
+        # Only users the request user follows are serialized here (the
+        # subscriptions list and a successful subscribe), so no query is
+        # needed; an `is_subscribed` annotation, if present, takes precedence
+        return getattr(obj, 'is_subscribed', True)
 
     def get_recipes(self, obj):
         """Get limited recipes for the subscribed author ('obj')."""
         request = self.context.get('request')
         limit_param = request.query_params.get('recipes_limit')
-        recipes = obj.recipes.all() # 'obj' is the author (User model)
+        # 'obj' is the author (User model); slicing reads the prefetched
+        # recipes if any (subscriptions), otherwise it becomes a SQL LIMIT
+        recipes = obj.recipes.all()
         if limit_param:
             try:
                 limit = int(limit_param)
                 recipes = recipes[:limit]
             except (ValueError, TypeError):
                 pass # Ignore invalid limit
-        # Use the minified serializer for recipes list
-        return RecipeMinifiedSerializer(recipes, many=True, context=self.context).data
+        # Same shape as RecipeMinifiedSerializer, built without the per-field
+        # overhead of a ModelSerializer for every author x recipe
+        return [
+            {
+                'id': recipe.id,
+                'name': recipe.name,
+                'image': build_media_url(request, recipe.image),
+                'cooking_time': recipe.cooking_time,
+            } for recipe in recipes
+        ]
 
     def get_recipes_count(self, obj):
-        """Count recipes for the subscribed author ('obj')."""
-        return obj.recipes.count() # 'obj' is the author (User model)
\ No newline at end of file
+        """
+        Count recipes for the subscribed author ('obj').
+        Annotated by `User.objects.with_recipes_count()`.
+        """
+        return obj.recipes_count
\ No newline at end of file
@@ -0,0 +1,15 @@
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Ingredient, Tag
+
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=Ingredient)
+def clear_catalog_cache(**kwargs):
+    """
+    Drop the cached tag/ingredient responses when either one changes.
+    QuerySet.update(), bulk_create() and bulk_update() send no signals:
+    clear caches['catalog'] by hand after using them on these models.
+    """
+    caches['catalog'].clear()
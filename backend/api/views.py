@@ -1,5 +1,12 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from itertools import chain
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import (CharField, Exists, OuterRef, Prefetch, Sum,
+                              TextField, Value)
+from django.db.models.functions import Cast, Concat
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import viewsets, status, permissions, mixins
@@ -15,7 +22,33 @@ from .serializers import (TagSerializer, IngredientSerializer,
                           CustomUserSerializer) # Import CustomUserSerializer
 from .permissions import IsOwnerOrReadOnly # Import custom permissions
 from .filters import RecipeFilter, IngredientSearchFilter
-from .pagination import CustomPageNumberPagination
+from .pagination import (CustomPageNumberPagination, RecipePagination,
+                         SubscriptionPagination)
+
+class CatalogCacheMixin:
+    """
+    Cache the serialized list/retrieve payloads of the read-only tag and
+    ingredient endpoints in the 'catalog' cache. The key includes the query
+    string, so each ingredient search is cached separately. Only the server
+    copy is cached (no Cache-Control headers are sent), so clearing it in
+    api/signals.py takes effect for clients right away.
+    """
+    def _get_cached_response(self, request, view_method, *args, **kwargs):
+        cache = caches['catalog']
+        key = f'catalog:{request.get_full_path()}'
+        data = cache.get(key)
+        if data is None:
+            data = view_method(request, *args, **kwargs).data
+            cache.set(key, data, settings.CATALOG_CACHE_TIMEOUT)
+        return Response(data)
+
+    def list(self, request, *args, **kwargs):
+        return self._get_cached_response(
+            request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._get_cached_response(
+            request, super().retrieve, *args, **kwargs)
 
 
 class CustomUserViewSet(DjoserUserViewSet):
@@ -30,8 +63,19 @@ class CustomUserViewSet(DjoserUserViewSet):
     # Permissions are handled by Djoser for most actions (e.g., AllowAny for list/retrieve, IsAuthenticated for me)
     # We add specific permissions for custom actions.
 
+    def get_queryset(self):
+        """
+        Annotate subscription status for the request user; the read-only
+        actions load only the columns the serializer renders.
+        """
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.only_profile()
+        return queryset.with_is_subscribed(self.request.user)
+
     @action(detail=False, methods=['get'],
-            permission_classes=[permissions.IsAuthenticated])
+            permission_classes=[permissions.IsAuthenticated],
+            pagination_class=SubscriptionPagination)
     def subscriptions(self, request):
         """
         List users the current authenticated user is subscribed to.
@@ -39,7 +83,13 @@ class CustomUserViewSet(DjoserUserViewSet):
         """
         user = request.user
         # Get User objects the current user is following
-        followed_users = User.objects.filter(following__user=user)
+        followed_users = User.objects.filter(
+            following__user=user
+        ).with_recipes_count().order_by('id').prefetch_related(
+            # Fetch all authors' recipes in one query, only the minified fields
+            Prefetch('recipes', queryset=Recipe.objects.only(
+                'id', 'author_id', 'name', 'image', 'cooking_time'))
+        ) # Meta.ordering is dropped with GROUP BY, hence order_by('id')
         page = self.paginate_queryset(followed_users)
         # Use FollowSerializer to represent the followed users, including their recipes
         serializer = FollowSerializer(page, many=True, context={'request': request})
@@ -53,30 +103,43 @@ class CustomUserViewSet(DjoserUserViewSet):
         Requires authentication.
         """
         user = request.user
-        following_user = get_object_or_404(User, id=id)
-
-        if user == following_user:
+        try:
+            following_id = int(id)
+        except ValueError:
+            raise Http404
+        # Reject self-subscription before touching the database
+        if following_id == user.pk:
             return Response({'errors': 'You cannot subscribe to yourself.'},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        follow_instance = Follow.objects.filter(user=user, following=following_user)
+        # Load only the columns FollowSerializer renders; the recipe count
+        # is needed for the POST response only
+        users = User.objects.only(
+            'id', 'email', 'username', 'first_name', 'last_name')
+        if request.method == 'POST':
+            users = users.with_recipes_count()
+        following_user = get_object_or_404(users, id=following_id)
 
         if request.method == 'POST':
-            if follow_instance.exists():
+            # Create the follow relationship; the unique constraint rejects
+            # duplicates, so no separate EXISTS query (and no race) is needed
+            try:
+                with transaction.atomic():
+                    Follow.objects.create(user=user, following=following_user)
+            except IntegrityError:
                 return Response({'errors': 'You are already subscribed to this user.'},
                                 status=status.HTTP_400_BAD_REQUEST)
-            # Create the follow relationship
-            Follow.objects.create(user=user, following=following_user)
             # Return the representation of the followed user
             serializer = FollowSerializer(following_user, context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         elif request.method == 'DELETE':
-            if not follow_instance.exists():
+            # Delete the follow relationship in one query
+            deleted, _ = Follow.objects.filter(
+                user=user, following=following_user).delete()
+            if not deleted:
                 return Response({'errors': 'You are not subscribed to this user.'},
                                 status=status.HTTP_400_BAD_REQUEST)
-            # Delete the follow relationship
-            follow_instance.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
     
     def avatar(self, request):
@@ -93,10 +156,10 @@ class CustomUserViewSet(DjoserUserViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for Tags (Read Only).
-    Accessible by anyone. No pagination.
+    Accessible by anyone. No pagination. Responses are cached.
     """
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
@@ -104,10 +167,11 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None # No pagination for tags
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for Ingredients (Read Only with Search).
     Accessible by anyone. Supports searching by name start. No pagination.
+    Responses are cached.
     """
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
@@ -133,7 +197,20 @@ class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = [IsOwnerOrReadOnly]
     filter_backends = [DjangoFilterBackend] # Enable django-filter
     filterset_class = RecipeFilter # Use the custom filterset
-    pagination_class = CustomPageNumberPagination # Use custom pagination
+    pagination_class = RecipePagination # Page numbers, or keyset with ?cursor=
+
+    def get_queryset(self):
+        """
+        For read actions, prefetch the relations the serializer walks and
+        annotate the favorite/shopping cart flags (EXISTS semi-joins, also
+        used by RecipeFilter). Write actions re-read the recipe for their
+        response (RecipeWriteSerializer), so they get the bare queryset.
+        """
+        user = self.request.user
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            return queryset.with_related(user).with_user_flags(user)
+        return queryset
 
     def get_serializer_class(self):
         """Return appropriate serializer class based on action."""
@@ -153,23 +230,38 @@ class RecipeViewSet(viewsets.ModelViewSet):
         Requires authentication.
         """
         user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
-        instance = related_model.objects.filter(user=user, recipe=recipe)
+        try:
+            recipe_id = int(pk)
+        except ValueError:
+            raise Http404
+        # The recipe is not fetched up front: the write goes by recipe_id,
+        # and its existence is only checked to explain a failed write
 
         if request.method == 'POST':
-            if instance.exists():
+            # Create the relationship; the (user, recipe) unique constraint
+            # rejects duplicates and the recipe FK rejects missing recipes
+            # (checked when the atomic block commits), so no separate
+            # queries are needed
+            try:
+                with transaction.atomic():
+                    related_model.objects.create(user=user, recipe_id=recipe_id)
+            except IntegrityError:
+                get_object_or_404(Recipe.objects.only('id'), pk=recipe_id)
                 return Response({'errors': error_msg_exists}, status=status.HTTP_400_BAD_REQUEST)
-            # Create the relationship
-            related_model.objects.create(user=user, recipe=recipe)
-            # Return the minified recipe representation
+            # Return the minified recipe representation, reading only its columns
+            recipe = get_object_or_404(
+                Recipe.objects.only('id', 'name', 'image', 'cooking_time'),
+                pk=recipe_id)
             serializer = serializer_class(recipe, context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         elif request.method == 'DELETE':
-            if not instance.exists():
+            # Delete the relationship in one query
+            deleted, _ = related_model.objects.filter(
+                user=user, recipe_id=recipe_id).delete()
+            if not deleted:
+                get_object_or_404(Recipe.objects.only('id'), pk=recipe_id)
                 return Response({'errors': error_msg_not_exists}, status=status.HTTP_400_BAD_REQUEST)
-            # Delete the relationship
-            instance.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['post', 'delete'],
@@ -206,13 +298,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
         Aggregates ingredients from all recipes in the user's shopping cart.
         """
         user = request.user
-        # Check if the shopping cart is empty first
-        if not ShoppingCart.objects.filter(user=user).exists():
-             return Response({'errors': 'Shopping cart is empty.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Get ingredients from recipes in the user's cart, aggregate amounts
+        # Get ingredients from recipes in the user's cart, aggregate amounts;
+        # the cart is checked with an EXISTS semi-join on the (user, recipe)
+        # unique index, without joining through the recipe table
+        in_cart = ShoppingCart.objects.filter(
+            user=user, recipe=OuterRef('recipe_id'))
         ingredients = RecipeIngredient.objects.filter(
-            recipe__in_shopping_carts__user=user # Filter through the ShoppingCart relation
+            Exists(in_cart)
         ).values(
             # Select ingredient fields
             'ingredient__name',
@@ -220,19 +312,29 @@ class RecipeViewSet(viewsets.ModelViewSet):
         ).annotate(
             # Sum the amount for each unique ingredient+unit combination
             total_amount=Sum('amount')
-        ).order_by('ingredient__name') # Ensure consistent order
-
-        # Prepare the text content
-        shopping_list_content = "Foodgram Shopping List:\n\n"
-        for item in ingredients:
-            shopping_list_content += (
-                f"- {item['ingredient__name']} "
-                f"({item['ingredient__measurement_unit']}): "
-                f"{item['total_amount']}\n"
+        ).annotate(
+            # Format each line in SQL: "- name (unit): total"
+            line=Concat(
+                Value('- '), 'ingredient__name',
+                Value(' ('), 'ingredient__measurement_unit',
+                Value('): '), Cast('total_amount', CharField()),
+                output_field=TextField()
             )
+        ).order_by('ingredient__name').values_list('line', flat=True) # Ensure consistent order
+        # Fetch in chunks; an empty result doubles as the empty cart check
+        lines = ingredients.iterator(chunk_size=500)
+        first_line = next(lines, None)
+        if first_line is None:
+            return Response({'errors': 'Shopping cart is empty.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        def shopping_list_lines():
+            """Yield the text content line by line."""
+            yield "Foodgram Shopping List:\n\n"
+            for line in chain((first_line,), lines):
+                yield line + '\n'
 
-        # Create the HttpResponse with plain text content type
-        response = HttpResponse(shopping_list_content, content_type='text/plain; charset=utf-8')
+        # Stream the list with plain text content type instead of building it in memory
+        response = StreamingHttpResponse(shopping_list_lines(), content_type='text/plain; charset=utf-8')
         # Set the Content-Disposition header to trigger download
         response['Content-Disposition'] = 'attachment; filename="foodgram_shopping_list.txt"'
         return response
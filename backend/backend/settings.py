@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -155,6 +156,28 @@ MEDIA_ROOT = BASE_DIR / 'media'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Caches
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Responses of the read-only tag/ingredient endpoints, cleared whenever
+    # a Tag or Ingredient is saved or deleted (see api/signals.py).
+    # File based, so all Gunicorn workers share it and the clear reaches
+    # every one of them; the directory must be writable by the workers.
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv(
+            'CATALOG_CACHE_DIR',
+            os.path.join(tempfile.gettempdir(), 'foodgram_catalog_cache')
+        ),
+    },
+}
+CATALOG_CACHE_TIMEOUT = 60 * 60 # Seconds
+
+
 # Django REST Framework Settings
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [